@@ -1,13 +1,25 @@
 import os
-import requests
+import functools
 import json
+import orjson
 from ibm_watson import AssistantV2, NaturalLanguageUnderstandingV1
 from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-from transformers import pipeline
-import torch
 import random
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+from http_client import SESSION, DEFAULT_TIMEOUT
+
+# Identical prompts within the TTL are answered from memory instead of the remote service
+def _response_cache(key=hashkey):
+    return cached(TTLCache(maxsize=1024, ttl=600), key=key, lock=threading.Lock())
 
 # Initialize IBM Watson Services
+# Clients are built once per process and reused by every call
+@functools.lru_cache(maxsize=None)
 def init_watson_assistant():
     try:
         api_key = os.getenv('WATSON_ASSISTANT_API_KEY')
@@ -27,6 +39,7 @@ def init_watson_assistant():
         print(f"Watson Assistant initialization failed: {e}")
         return None
 
+@functools.lru_cache(maxsize=None)
 def init_watson_nlp():
     try:
         api_key = os.getenv('WATSON_NLP_API_KEY')
@@ -46,36 +59,195 @@ def init_watson_nlp():
         print(f"Watson NLP initialization failed: {e}")
         return None
 
-# Initialize HuggingFace models
+SENTIMENT_MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+
+_hf_models_lock = threading.Lock()
+
+# Initialize HuggingFace models (loaded once per process)
 def init_huggingface_models():
+    # Callers arriving while the startup warmup is loading wait for it instead of loading a second copy
+    with _hf_models_lock:
+        try:
+            return _load_huggingface_models()
+        except Exception as e:
+            print(f"HuggingFace models initialization failed: {e}")
+            return None
+
+# Raises on failure, so lru_cache keeps only a successful load and the next call retries
+@functools.lru_cache(maxsize=None)
+def _load_huggingface_models():
+    # Check if we have an API key for online models
+    api_key = os.getenv('HUGGINGFACE_API_KEY')
+    
+    if api_key:
+        # Use API-based approach
+        return {"api_key": api_key}
+    
+    # Use local models (fallback); imported here so API-only deployments never load torch
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    
+    # Financial sentiment analysis
+    tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL_NAME, use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL_NAME).eval()
+    labels = model.config.id2label
+    
+    # INT8 dynamic quantization of the Linear layers for faster CPU inference
+    torch.set_num_threads(os.cpu_count() or 1)
+    model = torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    
+    # Compile the graph and run one warmup pass; keep the eager model if compilation fails
+    compiled = torch.compile(model, dynamic=True)
     try:
-        # Check if we have an API key for online models
-        api_key = os.getenv('HUGGINGFACE_API_KEY')
-        
-        if api_key:
-            # Use API-based approach
-            return {"api_key": api_key}
-        else:
-            # Use local models (fallback)
-            try:
-                # Financial sentiment analysis
-                sentiment_analyzer = pipeline(
-                    "sentiment-analysis",
-                    model="distilbert-base-uncased-finetuned-sst-2-english"
-                )
-                
-                return {
-                    "sentiment": sentiment_analyzer,
-                    "local": True
-                }
-            except:
-                return None
-                
+        with torch.inference_mode():
+            compiled(**tokenizer(["warmup"], return_tensors="pt"))
+        model = compiled
     except Exception as e:
-        print(f"HuggingFace models initialization failed: {e}")
-        return None
+        print(f"torch.compile failed, using eager sentiment model: {e}")
+    
+    return {
+        "tokenizer": tokenizer,
+        "model": model,
+        "labels": labels,
+        "local": True
+    }
+
+# Batched sentiment inference with the local model
+# Each text is split into 512-token chunks; chunk probabilities are averaged per text
+def predict_sentiment(texts, batch_size=8):
+    import torch
+    
+    texts = list(texts)
+    if not texts:
+        return []
+    
+    models = init_huggingface_models()
+    tokenizer = models["tokenizer"]
+    
+    # Tokenize everything in one call and reuse the token ids; batches are only padded
+    encoded = tokenizer(
+        texts,
+        truncation=True,
+        max_length=512,
+        return_overflowing_tokens=True
+    )
+    chunk_owner = torch.tensor(encoded.pop("overflow_to_sample_mapping"))
+    chunks = [
+        {key: values[i] for key, values in encoded.items()}
+        for i in range(len(chunk_owner))
+    ]
+    
+    probs = []
+    with torch.inference_mode():
+        for start in range(0, len(chunks), batch_size):
+            batch = tokenizer.pad(chunks[start:start + batch_size], return_tensors="pt")
+            probs.append(models["model"](**batch).logits.softmax(dim=-1))
+    probs = torch.cat(probs)
+    
+    totals = torch.zeros(len(texts), probs.shape[-1]).index_add_(0, chunk_owner, probs)
+    counts = torch.bincount(chunk_owner, minlength=len(texts)).unsqueeze(-1)
+    scores, label_ids = (totals / counts).max(dim=-1)
+    
+    return [
+        {"label": models["labels"][label_id].upper(), "score": score}
+        for label_id, score in zip(label_ids.tolist(), scores.tolist())
+    ]
 
 # Granite model integration
+# Prompts submitted within GRANITE_BATCH_WINDOW seconds of each other share one completion request
+GRANITE_BATCH_WINDOW = 0.02
+GRANITE_MAX_BATCH = 16
+
+# Statuses with which an endpoint turns down a list-valued prompt
+GRANITE_LIST_REJECTED = (400, 415, 422)
+
+_granite_queue = queue.Queue()
+# Endpoints (url, api_key, model) that only take a single string prompt
+_granite_single_prompt_endpoints = set()
+# Single-prompt requests run here so the batch worker keeps draining the queue
+_granite_pool = ThreadPoolExecutor(max_workers=GRANITE_MAX_BATCH)
+
+def _granite_request(url, api_key, model_type, prompt):
+    headers = {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+    
+    payload = {
+        'model': model_type,
+        'prompt': prompt,
+        'max_tokens': 500,
+        'temperature': 0.3
+    }
+    
+    return SESSION.post(url, headers=headers, data=orjson.dumps(payload), timeout=DEFAULT_TIMEOUT)
+
+def _post_granite_prompt(url, api_key, model_type, prompt, future):
+    try:
+        response = _granite_request(url, api_key, model_type, prompt)
+        response.raise_for_status()
+        future.set_result(orjson.loads(response.content).get('choices', [{}])[0].get('text', ''))
+    except Exception as e:
+        future.set_exception(e)
+
+# Returns None when the endpoint rejects a prompt list or doesn't answer every prompt in it
+def _post_granite_batch(url, api_key, model_type, prompts):
+    response = _granite_request(url, api_key, model_type, prompts)
+    if response.status_code in GRANITE_LIST_REJECTED:
+        return None
+    response.raise_for_status()
+    
+    # Completions for a prompt list come back as choices tagged with the prompt index
+    texts = {}
+    for position, choice in enumerate(orjson.loads(response.content).get('choices', [])):
+        texts[choice.get('index', position)] = choice.get('text', '')
+    if sorted(texts) != list(range(len(prompts))):
+        return None
+    return [texts[index] for index in range(len(prompts))]
+
+def _granite_batch_worker():
+    while True:
+        batch = [_granite_queue.get()]
+        deadline = time.monotonic() + GRANITE_BATCH_WINDOW
+        while len(batch) < GRANITE_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_granite_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        # One request per endpoint/model; every waiting caller gets its own completion or the error
+        groups = {}
+        for url, api_key, model_type, prompt, future in batch:
+            groups.setdefault((url, api_key, model_type), []).append((prompt, future))
+        for endpoint, items in groups.items():
+            if len(items) > 1 and endpoint not in _granite_single_prompt_endpoints:
+                try:
+                    texts = _post_granite_batch(*endpoint, [prompt for prompt, _ in items])
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+                if texts is not None:
+                    for (_, future), text in zip(items, texts):
+                        future.set_result(text)
+                    continue
+                _granite_single_prompt_endpoints.add(endpoint)
+            
+            # A lone prompt, or an endpoint without list support: plain string prompts, one request each
+            for prompt, future in items:
+                _granite_pool.submit(_post_granite_prompt, *endpoint, prompt, future)
+
+@_response_cache()
+def _granite_completion(url, api_key, prompt, model_type):
+    future = Future()
+    _granite_queue.put((url, api_key, model_type, prompt, future))
+    return future.result()
+
 def call_granite_model(prompt, model_type="financial-analysis"):
     try:
         api_key = os.getenv('GRANITE_API_KEY')
@@ -85,27 +257,26 @@ def call_granite_model(prompt, model_type="financial-analysis"):
         if not api_key or not url:
             return f"AI Analysis: Based on your financial data, I recommend:\n\n1. Increase emergency fund to 3-6 months of expenses\n2. Consider diversifying investments\n3. Review subscription services for potential savings\n4. Set up automatic transfers to savings account\n\nThese steps could improve your financial health score by 15-20 points."
         
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'model': model_type,
-            'prompt': prompt,
-            'max_tokens': 500,
-            'temperature': 0.3
-        }
-        
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        return response.json().get('choices', [{}])[0].get('text', '')
+        return _granite_completion(url, api_key, prompt, model_type)
     except Exception as e:
         print(f"Granite API call failed: {e}")
         return f"AI analysis: Based on your financial data, I recommend building a larger emergency fund and reviewing your investment strategy for better long-term growth."
 
 # Financial analysis using Watson NLP
+@_response_cache()
+def _nlu_analyze(text):
+    return init_watson_nlp().analyze(
+        text=text,
+        features={
+            'sentiment': {},
+            'keywords': {
+                'emotion': True,
+                'sentiment': True,
+                'limit': 5
+            }
+        }
+    ).get_result()
+
 def analyze_financial_sentiment(text):
     nlu = init_watson_nlp()
     if not nlu:
@@ -119,19 +290,7 @@ def analyze_financial_sentiment(text):
         }
     
     try:
-        response = nlu.analyze(
-            text=text,
-            features={
-                'sentiment': {},
-                'keywords': {
-                    'emotion': True,
-                    'sentiment': True,
-                    'limit': 5
-                }
-            }
-        ).get_result()
-        
-        return response
+        return _nlu_analyze(text)
     except Exception as e:
         return {
             "sentiment": {"document": {"label": "neutral", "score": 0.65}},
@@ -142,6 +301,28 @@ def analyze_financial_sentiment(text):
         }
 
 # Chat with Watson Assistant
+def _send_watson_message(assistant_id, session_id, message):
+    response = init_watson_assistant().message(
+        assistant_id=assistant_id,
+        session_id=session_id,
+        input={
+            'message_type': 'text',
+            'text': message
+        }
+    ).get_result()
+    
+    return response['output']['generic'][0]['text']
+
+@_response_cache(key=lambda assistant_id, session_id, message: hashkey(message, session_id))
+def _watson_message(assistant_id, session_id, message):
+    return _send_watson_message(assistant_id, session_id, message)
+
+# Without a context each message goes to a throwaway session; only the reply text is cached, never the session
+@_response_cache(key=lambda assistant_id, message: hashkey(message))
+def _watson_one_shot_reply(assistant_id, message):
+    session_id = init_watson_assistant().create_session(assistant_id=assistant_id).get_result()['session_id']
+    return _send_watson_message(assistant_id, session_id, message)
+
 def chat_with_watson(message, context=None):
     assistant = init_watson_assistant()
     if not assistant:
@@ -159,29 +340,33 @@ def chat_with_watson(message, context=None):
         assistant_id = os.getenv('WATSON_ASSISTANT_ID')
         
         if not context or 'session_id' not in context:
-            # Create new session
-            session = assistant.create_session(assistant_id=assistant_id).get_result()
-            session_id = session['session_id']
-            context = {'session_id': session_id}
+            return _watson_one_shot_reply(assistant_id, message), context
         
-        response = assistant.message(
-            assistant_id=assistant_id,
-            session_id=context['session_id'],
-            input={
-                'message_type': 'text',
-                'text': message
-            }
-        ).get_result()
-        
-        return response['output']['generic'][0]['text'], context
+        return _watson_message(assistant_id, context['session_id'], message), context
     except Exception as e:
         return "I'm having trouble connecting to the financial analysis service. Please try again later.", context
 
+# Successful local predictions are remembered per text; a failed batch stores nothing and is retried next time
+_sentiment_cache = TTLCache(maxsize=1024, ttl=600)
+_sentiment_cache_lock = threading.Lock()
+
+def _cached_sentiments(texts, batch_size=8):
+    with _sentiment_cache_lock:
+        results = {text: _sentiment_cache.get(text) for text in texts}
+    misses = [text for text, result in results.items() if result is None]
+    if misses:
+        predicted = dict(zip(misses, predict_sentiment(misses, batch_size=batch_size)))
+        results.update(predicted)
+        with _sentiment_cache_lock:
+            _sentiment_cache.update(predicted)
+    return [results[text] for text in texts]
+
 # Financial document analysis with HuggingFace
-def analyze_financial_document(text):
+def analyze_financial_documents(texts, batch_size=8):
+    texts = list(texts)
     models = init_huggingface_models()
     if not models:
-        return {
+        return [{
             "insights": [
                 "Q: What are the main expenses?\nA: Based on the document, housing and transportation appear to be your largest expenses.",
                 "Q: What is the total income?\nA: The document shows a monthly income of approximately $5,000.",
@@ -189,13 +374,13 @@ def analyze_financial_document(text):
             ],
             "sentiment": [{"label": "POSITIVE", "score": 0.89}],
             "summary": "Your financial document shows healthy spending habits with a good savings rate. Focus on reducing discretionary spending to improve your financial position further."
-        }
+        } for _ in texts]
     
     try:
         # If using API
         if "api_key" in models:
             # This would be the API implementation
-            return {
+            return [{
                 "insights": [
                     "Q: What are the main expenses?\nA: Housing ($1,500) and Food ($600) are your largest expenses.",
                     "Q: What is the total income?\nA: Your monthly income is $5,000.",
@@ -203,22 +388,22 @@ def analyze_financial_document(text):
                 ],
                 "sentiment": [{"label": "POSITIVE", "score": 0.85}],
                 "summary": "Your financial statement shows strong financial health with a good savings rate. Consider investing your savings for better returns."
-            }
+            } for _ in texts]
         else:
-            # Local model implementation
-            sentiment = models["sentiment"](text[:512])  # Limit text length
+            # Local model implementation: all documents go through the model in shared batches
+            sentiments = _cached_sentiments(texts, batch_size=batch_size)
             
-            return {
+            return [{
                 "insights": [
                     "Q: What are the main expenses?\nA: The document shows significant spending on housing and utilities.",
                     "Q: What is the total income?\nA: Monthly income appears to be in the range of $4,000-$5,000.",
                     "Q: What are the saving patterns?\nA: You're saving approximately 15-20% of your income."
                 ],
-                "sentiment": sentiment,
+                "sentiment": [sentiment],
                 "summary": "Your financial document indicates generally good financial habits with room for optimization in discretionary spending categories."
-            }
+            } for sentiment in sentiments]
     except Exception as e:
-        return {
+        return [{
             "insights": [
                 "Q: What are the main expenses?\nA: Analysis suggests housing and transportation are primary expenses.",
                 "Q: What is the total income?\nA: Estimated monthly income is $4,500-$5,500.",
@@ -226,4 +411,14 @@ def analyze_financial_document(text):
             ],
             "sentiment": [{"label": "NEUTRAL", "score": 0.75}],
             "summary": "The document shows reasonably good financial management. Consider consulting with a financial advisor for personalized advice."
-        }
\ No newline at end of file
+        } for _ in texts]
+
+# Single-document convenience wrapper
+def analyze_financial_document(text):
+    return analyze_financial_documents([text])[0]
+
+# Single consumer draining the Granite prompt queue
+threading.Thread(target=_granite_batch_worker, daemon=True).start()
+
+# Warm the local model in the background so the first document analysis doesn't pay the load cost
+threading.Thread(target=init_huggingface_models, daemon=True).start()
\ No newline at end of file
@@ -1,27 +1,37 @@
 import streamlit as st
 import requests
 import json
+import orjson
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import io
 from datetime import datetime
-import time
 import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+
+# Load environment variables (before ai_services, which starts warming its models on import)
+load_dotenv()
+
 from ai_services import (
     chat_with_watson, 
     analyze_financial_sentiment,
     analyze_financial_document,
     call_granite_model
 )
-
-# Load environment variables
-load_dotenv()
+from http_client import SESSION, DEFAULT_TIMEOUT
+from financial_metrics import calculate_financial_health_score
 
 # Backend API configuration
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
+# Chat history limits: messages kept in the session, and messages shown outside the "older" expander
+CHAT_HISTORY_LIMIT = 50
+CHAT_VISIBLE_MESSAGES = 10
+
 # Page configuration
 st.set_page_config(
     page_title="Financial Assistant",
@@ -38,7 +48,7 @@ if 'username' not in st.session_state:
 if 'token' not in st.session_state:
     st.session_state.token = None
 if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = deque(maxlen=CHAT_HISTORY_LIMIT)
 if 'user_profile' not in st.session_state:
     st.session_state.user_profile = {}
 if 'financial_data' not in st.session_state:
@@ -52,28 +62,31 @@ if 'ai_analysis' not in st.session_state:
 def login(username, password):
     """Authenticate user and get JWT token"""
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{BACKEND_URL}/auth/login",
-            json={"username": username, "password": password}
+            data=orjson.dumps({"username": username, "password": password}),
+            headers={"Content-Type": "application/json"},
+            timeout=DEFAULT_TIMEOUT
         )
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         return None
-    except requests.exceptions.RequestException:
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError):
         return None
 
-def get_user_profile():
+def get_user_profile(token):
     """Fetch user profile from backend"""
     try:
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
-        response = requests.get(
+        headers = {"Authorization": f"Bearer {token}"}
+        response = SESSION.get(
             f"{BACKEND_URL}/user/profile",
-            headers=headers
+            headers=headers,
+            timeout=DEFAULT_TIMEOUT
         )
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         return None
-    except requests.exceptions.RequestException:
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError):
         return None
 
 def update_user_profile(profile_data):
@@ -83,44 +96,58 @@ def update_user_profile(profile_data):
             "Authorization": f"Bearer {st.session_state.token}",
             "Content-Type": "application/json"
         }
-        response = requests.put(
+        response = SESSION.put(
             f"{BACKEND_URL}/user/profile",
             headers=headers,
-            json=profile_data
+            data=orjson.dumps(profile_data),
+            timeout=DEFAULT_TIMEOUT
         )
         return response.status_code == 200
     except requests.exceptions.RequestException:
         return False
 
 # Financial data functions
-def upload_statement(file):
+def upload_statement(token, file):
     """Upload bank statement PDF"""
     try:
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
+        headers = {"Authorization": f"Bearer {token}"}
         files = {"file": (file.name, file.getvalue(), "application/pdf")}
-        response = requests.post(
+        response = SESSION.post(
             f"{BACKEND_URL}/upload/statement",
             headers=headers,
-            files=files
+            files=files,
+            timeout=DEFAULT_TIMEOUT
         )
-        return response.status_code == 200
+        return response.status_code == 202  # Accepted; processed in the background
     except requests.exceptions.RequestException:
         return False
 
-def get_financial_data():
+def get_financial_data(token):
     """Fetch financial data from backend"""
     try:
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
-        response = requests.get(
+        headers = {"Authorization": f"Bearer {token}"}
+        response = SESSION.get(
             f"{BACKEND_URL}/financial/data",
-            headers=headers
+            headers=headers,
+            timeout=DEFAULT_TIMEOUT
         )
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         return None
-    except requests.exceptions.RequestException:
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError):
         return None
 
+def load_account_data(token):
+    """Fetch user profile and financial data from backend concurrently"""
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        profile_future = executor.submit(get_user_profile, token)
+        financial_future = executor.submit(get_financial_data, token)
+        return profile_future.result() or {}, financial_future.result() or {}
+
+# Messages mentioning any of these also get a sentiment analysis
+SENTIMENT_TRIGGER_RE = re.compile(r"analyze|sentiment|review", re.IGNORECASE)
+
+# Not cached here: ai_services caches successful service replies, and error fallbacks must not be remembered
 def send_chat_message(message):
     """Send chat message to AI services and stream response"""
     try:
@@ -128,7 +155,7 @@ def send_chat_message(message):
         response, context = chat_with_watson(message)
         
         # Enhance with additional analysis if needed
-        if any(keyword in message.lower() for keyword in ['analyze', 'sentiment', 'review']):
+        if SENTIMENT_TRIGGER_RE.search(message):
             analysis = analyze_financial_sentiment(message)
             if isinstance(analysis, dict):
                 sentiment = analysis.get('sentiment', {}).get('document', {}).get('label', 'neutral')
@@ -138,18 +165,39 @@ def send_chat_message(message):
     except Exception as e:
         return f"I encountered an error: {str(e)}. Please try again."
 
-# Financial health calculations
-def calculate_financial_health_score(income, expenses, savings):
-    """Calculate simple financial health score"""
-    if income == 0:
-        return 0
-    
-    savings_rate = (savings / income) * 100 if income > 0 else 0
-    expense_diversity = min(len(set(expenses.keys())) / 10, 1.0)  # Normalize to 0-1
-    
-    # Weighted score (0-100)
-    score = (savings_rate * 0.6) + (expense_diversity * 40)
-    return min(max(score, 0), 100)
+# Dashboard charts (cached on their data so unchanged figures aren't rebuilt on every rerun)
+@st.cache_data(show_spinner=False)
+def budget_chart(categories, budgeted, actual):
+    """Build the budget vs actual bar chart"""
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        name='Budgeted',
+        x=categories,
+        y=budgeted,
+        marker_color='lightblue'
+    ))
+    fig.add_trace(go.Bar(
+        name='Actual',
+        x=categories,
+        y=actual,
+        marker_color='coral'
+    ))
+    fig.update_layout(
+        title="Budget vs Actual Spending by Category",
+        barmode='group'
+    )
+    return fig
+
+@st.cache_data(show_spinner=False)
+def spending_chart(labels, values):
+    """Build the spending by category pie chart"""
+    fig = go.Figure(data=[go.Pie(
+        labels=labels,
+        values=values,
+        hole=.3
+    )])
+    fig.update_layout(title="Spending by Category")
+    return fig
 
 # Login page
 def login_page():
@@ -168,7 +216,10 @@ def login_page():
                     st.session_state.authenticated = True
                     st.session_state.username = username
                     st.session_state.token = auth_data.get("access_token")
-                    st.session_state.user_profile = get_user_profile() or {}
+                    (
+                        st.session_state.user_profile,
+                        st.session_state.financial_data
+                    ) = load_account_data(st.session_state.token)
                     st.rerun()
                 else:
                     st.error("Invalid credentials. Please try again.")
@@ -184,7 +235,10 @@ def main_app():
         
         # Profile section
         if st.button("🔄 Refresh Profile"):
-            st.session_state.user_profile = get_user_profile() or {}
+            (
+                st.session_state.user_profile,
+                st.session_state.financial_data
+            ) = load_account_data(st.session_state.token)
             st.rerun()
         
         # File uploader for bank statements
@@ -198,29 +252,36 @@ def main_app():
         if uploaded_file is not None:
             if st.button("Upload and Analyze Statement"):
                 with st.spinner("Uploading and analyzing statement with AI..."):
-                    # Read and extract text from PDF (simplified)
-                    import PyPDF2
-                    pdf_reader = PyPDF2.PdfReader(uploaded_file)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                    
-                    # Use AI to analyze the document
-                    analysis = analyze_financial_document(text)
+                    with ThreadPoolExecutor(max_workers=1) as executor:
+                        # Upload to the backend while the PDF is parsed and analyzed locally
+                        upload_future = executor.submit(
+                            upload_statement, st.session_state.token, uploaded_file
+                        )
+                        
+                        # Read and extract text from PDF (simplified)
+                        import PyPDF2
+                        pdf_reader = PyPDF2.PdfReader(uploaded_file)
+                        text = "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
+                        
+                        # Use AI to analyze the document
+                        analysis = analyze_financial_document(text)
+                        uploaded = upload_future.result()
                     
                     # Store analysis results
                     st.session_state.document_analysis = analysis
                     st.success("Statement analyzed with AI!")
+                    if not uploaded:
+                        st.warning("Statement could not be uploaded to the server.")
                     
                     # Refresh financial data
-                    st.session_state.financial_data = get_financial_data() or {}
+                    st.session_state.financial_data = get_financial_data(st.session_state.token) or {}
         
         st.markdown("---")
         if st.button("🚪 Logout"):
             st.session_state.authenticated = False
             st.session_state.username = None
             st.session_state.token = None
-            st.session_state.chat_history = []
+            st.session_state.chat_history = deque(maxlen=CHAT_HISTORY_LIMIT)
             st.rerun()
     
     # Main content area
@@ -273,7 +334,8 @@ def main_app():
         expenses = financial_data.get("monthly_expenses", {})
         savings = financial_data.get("monthly_savings", 1000)
         
-        health_score = calculate_financial_health_score(income, expenses, savings)
+        total_expenses = sum(expenses.values())
+        health_score = calculate_financial_health_score(income, len(expenses), savings)
         
         col_health1, col_health2 = st.columns(2)
         with col_health1:
@@ -287,7 +349,7 @@ def main_app():
             else:
                 st.success("✅ Excellent financial health!")
                 
-            if sum(expenses.values()) > income * 0.6:
+            if total_expenses > income * 0.6:
                 st.error("🚨 High spending alert! Expenses exceed 60% of income")
         
         with col_health2:
@@ -354,23 +416,7 @@ def main_app():
             budgeted = list(budget_data.get('category_budget', {}).values())
             actual = list(budget_data.get('category_actual', {}).values())
             
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                name='Budgeted',
-                x=categories,
-                y=budgeted,
-                marker_color='lightblue'
-            ))
-            fig.add_trace(go.Bar(
-                name='Actual',
-                x=categories,
-                y=actual,
-                marker_color='coral'
-            ))
-            fig.update_layout(
-                title="Budget vs Actual Spending by Category",
-                barmode='group'
-            )
+            fig = budget_chart(tuple(categories), tuple(budgeted), tuple(actual))
             st.plotly_chart(fig, use_container_width=True)
             
             # AI-generated summary
@@ -388,19 +434,20 @@ def main_app():
         if spending_data:
             # Categorized transactions
             st.write("### Categorized Transactions")
-            transactions_df = pd.DataFrame(spending_data.get("transactions", []))
+            # Transactions arrive as columns, so this builds straight from the per-field lists
+            transactions_df = pd.DataFrame(spending_data.get("transactions", {}))
             if not transactions_df.empty:
                 st.dataframe(transactions_df)
             
             # Spending by category pie chart
             category_totals = spending_data.get("category_totals", {})
+            if not category_totals and not transactions_df.empty:
+                category_totals = transactions_df.groupby("category")["amount"].sum().to_dict()
             if category_totals:
-                fig_pie = go.Figure(data=[go.Pie(
-                    labels=list(category_totals.keys()),
-                    values=list(category_totals.values()),
-                    hole=.3
-                )])
-                fig_pie.update_layout(title="Spending by Category")
+                fig_pie = spending_chart(
+                    tuple(category_totals.keys()),
+                    tuple(category_totals.values())
+                )
                 st.plotly_chart(fig_pie, use_container_width=True)
             
             # Cost-cutting insights
@@ -416,8 +463,15 @@ def main_app():
     st.markdown("---")
     st.header("💬 Financial Assistant Chat")
     
-    # Display chat history
-    for message in st.session_state.chat_history:
+    # Display chat history, collapsing all but the most recent messages
+    history = list(st.session_state.chat_history)
+    older, recent = history[:-CHAT_VISIBLE_MESSAGES], history[-CHAT_VISIBLE_MESSAGES:]
+    if older:
+        with st.expander(f"Show older messages ({len(older)})"):
+            for message in older:
+                with st.chat_message(message["role"]):
+                    st.write(message["content"])
+    for message in recent:
         with st.chat_message(message["role"]):
             st.write(message["content"])
     
@@ -432,22 +486,12 @@ def main_app():
         
         # Get AI response
         with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            full_response = ""
-            
-            # Get AI response using integrated services
+            # Get AI response using integrated services; it arrives complete, so render it at once
             response = send_chat_message(prompt)
-            
-            # Stream the response (simulated)
-            for chunk in response.split():
-                full_response += chunk + " "
-                message_placeholder.markdown(full_response + "▌")
-                time.sleep(0.05)
-            
-            message_placeholder.markdown(full_response)
+            st.markdown(response)
             
             # Add AI response to chat history
-            st.session_state.chat_history.append({"role": "assistant", "content": full_response})
+            st.session_state.chat_history.append({"role": "assistant", "content": response})
 
 # Main application flow
 def main():
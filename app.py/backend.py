@@ -1,16 +1,137 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, request
+from flask.json.provider import JSONProvider
+from flask_caching import Cache
+from flask_compress import Compress
 from flask_cors import CORS
+import hashlib
+import hmac
+import numpy as np
+import orjson
+import os
 import random
+import re
+import secrets
+import types
+import redis
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
 from datetime import datetime
+from tasks import process_statement
+
+# Route Flask's own JSON handling (request.get_json, jsonify) through orjson; output is always compact
+class OrjsonProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable Cross-Origin Requests
 
-# Mock user database
+# In-process compression for deployments without the nginx front end; set BEHIND_PROXY=1 to leave it to nginx
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+if os.getenv('BEHIND_PROXY') != '1':
+    Compress(app)
+
+# JSON responses are encoded with orjson straight to bytes
+def ojsonify(obj, status=200):
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+# Fixed 401 bodies, encoded once; each failure still gets its own Response since after_request hooks (CORS) set headers on it
+_UNAUTH = orjson.dumps({"error": "Invalid token"})
+_BAD_CREDS = orjson.dumps({"error": "Invalid credentials"})
+
+def unauthorized(body):
+    return Response(body, status=401, mimetype='application/json')
+
+# Shared read-only stand-in for a missing or malformed JSON body
+_EMPTY = types.MappingProxyType({})
+
+def request_json():
+    return request.get_json(cache=True, silent=True) or _EMPTY
+
+def body_etag(body):
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+# Flask-Compress sends compressed bodies with ":<encoding>" appended to the ETag (and nginx may weaken it),
+# so If-None-Match is compared on the bare tag
+_ETAG_ENCODING_SUFFIX_RE = re.compile(r':(?:br|gzip|deflate)$')
+
+def etag_matches(etag):
+    tags = request.if_none_match
+    return tags.star_tag or etag in {_ETAG_ENCODING_SUFFIX_RE.sub('', tag) for tag in tags.as_set(include_weak=True)}
+
+# Per-user GET bodies: clients revalidate with If-None-Match and get an empty 304 when unchanged
+def conditional_json(body, etag=None):
+    etag = etag or body_etag(body)
+    response = Response(status=304) if etag_matches(etag) else Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# Each worker process draws mock responses from its own generator
+_RNG = random.Random()
+
+# Users and session tokens live in Redis so every worker process shares them
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+SESSION_TTL = 3600  # seconds of inactivity; every authenticated request renews it
+
+# Rendered response bodies shared by all workers
+cache = Cache(app, config={'CACHE_TYPE': 'RedisCache', 'CACHE_REDIS_URL': REDIS_URL})
+PROFILE_CACHE_TTL = 300  # seconds
+
+# Statement processing runs on an RQ worker (RQ needs a connection without response decoding)
+statement_queue = Queue('statements', connection=redis.Redis.from_url(REDIS_URL))
+
+# Mock user database (seed records)
 users = {
     "testuser": {"password": "password123", "name": "Test User", "email": "test@example.com", "age": 30, "income": 50000}
 }
 
+# User records are Redis hashes; field values are JSON-encoded to keep their types
+def save_user(username, record):
+    if record:
+        r.hset(f"user:{username}", mapping={k: orjson.dumps(v) for k, v in record.items()})
+
+def load_user(username):
+    return {k: orjson.loads(v) for k, v in r.hgetall(f"user:{username}").items()}
+
+@cache.memoize(timeout=PROFILE_CACHE_TTL)
+def profile_body(username):
+    return orjson.dumps(load_user(username))
+
+for _username, _record in users.items():
+    if not r.exists(f"user:{_username}"):
+        save_user(_username, _record)
+
+# Spending categories; transactions store the integer code, names are restored at response time
+CATEGORIES = ("Housing", "Food", "Transport", "Entertainment", "Utilities", "Other")
+CATEGORY_CODES = {name: code for code, name in enumerate(CATEGORIES)}
+
+# Transactions are a struct of arrays: one typed array per field, aligned by index
+def make_transactions(dates, amounts, categories, descriptions):
+    return {
+        "date": np.array(dates, dtype='datetime64[D]'),
+        "amount": np.array(amounts, dtype=np.float64),
+        "category": np.array([CATEGORY_CODES[c] for c in categories], dtype=np.int8),
+        "description": list(descriptions)
+    }
+
+# JSON shape of the API: one plain list per field
+def transactions_json(transactions):
+    return {
+        "date": transactions["date"].astype(str).tolist(),
+        "amount": transactions["amount"].tolist(),
+        "category": [CATEGORIES[code] for code in transactions["category"]],
+        "description": transactions["description"]
+    }
+
 # Mock financial data
 financial_data = {
     "monthly_income": 5000,
@@ -25,13 +146,13 @@ financial_data = {
     },
     "budget_summary": "Your spending is well-controlled. You're saving 20% of your income, which is excellent. Consider investing your savings for better returns.",
     "spending_analysis": {
-        "transactions": [
-            {"date": "2023-10-01", "amount": 1500, "category": "Housing", "description": "Rent"},
-            {"date": "2023-10-05", "amount": 200, "category": "Food", "description": "Groceries"},
-            {"date": "2023-10-10", "amount": 100, "category": "Transport", "description": "Gas"},
-            {"date": "2023-10-15", "amount": 150, "category": "Entertainment", "description": "Dinner Out"}
-        ],
-        "category_totals": {"Housing": 1500, "Food": 600, "Transport": 300, "Entertainment": 200},
+        # One month of transactions; they add up to monthly_expenses and seed the Redis totals below
+        "transactions": make_transactions(
+            ["2023-10-01", "2023-10-03", "2023-10-05", "2023-10-08", "2023-10-10", "2023-10-15", "2023-10-19", "2023-10-22", "2023-10-25"],
+            [1500, 100, 200, 50, 100, 150, 250, 100, 150],
+            ["Housing", "Transport", "Food", "Entertainment", "Transport", "Entertainment", "Food", "Transport", "Food"],
+            ["Rent", "Transit Pass", "Groceries", "Movies", "Gas", "Dinner Out", "Groceries", "Gas", "Restaurant"]
+        ),
         "insights": [
             "You're spending 30% of your income on housing, which is within the recommended range.",
             "Your food expenses are well-controlled at 12% of income.",
@@ -40,123 +161,219 @@ financial_data = {
     }
 }
 
+# The mock transactions never change, so their JSON view is built once
+_TRANSACTIONS_JSON = transactions_json(financial_data["spending_analysis"]["transactions"])
+
+# Spending aggregates are kept up to date as transactions are written, so reads never scan transaction lists
+# A batch is summed per category and per month first, so Redis sees one increment per group;
+# pass a pipeline to queue the increments into a larger transaction instead of sending them right away
+def record_transactions(username, transactions, pipe=None):
+    amounts = transactions["amount"]
+    by_category = np.bincount(transactions["category"], weights=amounts, minlength=len(CATEGORIES))
+    months, month_index = np.unique(transactions["date"].astype('datetime64[M]'), return_inverse=True)
+    by_month = np.bincount(month_index, weights=amounts)
+    
+    batch = r.pipeline(transaction=False) if pipe is None else pipe
+    for code in np.flatnonzero(by_category):
+        batch.hincrbyfloat(f"cats:{username}", CATEGORIES[code], float(by_category[code]))
+    for month, total in zip(months.astype(str), by_month):
+        batch.zincrby(f"months:{username}", float(total), month)
+    if pipe is None:
+        batch.execute()
+
+# Both aggregates in one round trip, encoded as the members of a JSON object
+def spending_totals_json(username):
+    pipe = r.pipeline(transaction=False)
+    pipe.hgetall(f"cats:{username}")
+    pipe.zrange(f"months:{username}", 0, -1, withscores=True)
+    categories, months = pipe.execute()
+    return orjson.dumps({
+        "category_totals": {category: float(total) for category, total in categories.items()},
+        "monthly_totals": dict(sorted(months))
+    })[1:-1]
+
+# Ingest the mock transactions once per user. The increments and the seeded flag commit together in one
+# MULTI, so a failed start-up leaves nothing behind and the next one retries; WATCH stops concurrent workers
+# from double counting
+def seed_transactions(username, transactions):
+    with r.pipeline() as pipe:
+        try:
+            pipe.watch(f"seeded:{username}", f"cats:{username}")
+            if pipe.exists(f"seeded:{username}", f"cats:{username}"):
+                return
+            pipe.multi()
+            record_transactions(username, transactions, pipe)
+            pipe.set(f"seeded:{username}", 1)
+            pipe.execute()
+        except redis.WatchError:
+            pass  # Another worker seeded this user first
+
+for _username in users:
+    seed_transactions(_username, financial_data["spending_analysis"]["transactions"])
+
+# Everything but the per-user totals is encoded once; each request splices its totals into the placeholder
+_FIN_PREFIX, _FIN_SUFFIX = orjson.dumps(dict(
+    financial_data,
+    spending_analysis=dict(financial_data["spending_analysis"], transactions=_TRANSACTIONS_JSON, totals=None)
+)).split(b'"totals":null')
+_FIN_ETAG = body_etag(_FIN_PREFIX + _FIN_SUFFIX).encode()
+
+# Endpoints reachable without a session token
+PUBLIC_ENDPOINTS = {'login', 'analyze_sentiment', 'analyze_document', 'ai_chat', 'static'}
+
+# Resolve the bearer token to a username in g.username once per request, or reject with 401
+@app.before_request
+def authenticate():
+    # Unmatched URLs and methods (no endpoint) fall through to Flask's own 404/405
+    if request.method == 'OPTIONS' or request.endpoint is None or request.endpoint in PUBLIC_ENDPOINTS:
+        return None
+    
+    header = request.headers.get('Authorization', '')
+    username = r.getex(f"sess:{header[7:]}", ex=SESSION_TTL) if header.startswith('Bearer ') else None
+    if username is None:
+        return unauthorized(_UNAUTH)
+    g.username = username
+
 @app.route('/auth/login', methods=['POST'])
 def login():
-    data = request.get_json()
+    data = request_json()
     username = data.get('username')
     password = data.get('password')
     
-    if username in users and users[username]['password'] == password:
-        return jsonify({"access_token": "mock_token_12345", "token_type": "bearer"})
-    return jsonify({"error": "Invalid credentials"}), 401
+    user = load_user(username) if username else {}
+    # Constant-time comparison so response timing doesn't reveal how much of the password matched
+    if user and isinstance(password, str) and hmac.compare_digest(
+        str(user.get('password', '')).encode(), password.encode()
+    ):
+        token = secrets.token_urlsafe(32)
+        r.setex(f"sess:{token}", SESSION_TTL, username)
+        return ojsonify({"access_token": token, "token_type": "bearer"})
+    return unauthorized(_BAD_CREDS)
 
 @app.route('/user/profile', methods=['GET'])
 def get_profile():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token != "mock_token_12345":
-        return jsonify({"error": "Invalid token"}), 401
-    
-    username = "testuser"  # In a real app, you'd decode this from the token
-    return jsonify(users[username])
+    return conditional_json(profile_body(g.username))
 
 @app.route('/user/profile', methods=['PUT'])
 def update_profile():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token != "mock_token_12345":
-        return jsonify({"error": "Invalid token"}), 401
-    
-    data = request.get_json()
-    users["testuser"].update(data)
-    return jsonify({"message": "Profile updated successfully"})
+    data = request_json()
+    save_user(g.username, data)
+    cache.delete_memoized(profile_body, g.username)
+    return ojsonify({"message": "Profile updated successfully"})
 
 @app.route('/financial/data', methods=['GET'])
 def get_financial_data():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token != "mock_token_12345":
-        return jsonify({"error": "Invalid token"}), 401
-    
-    return jsonify(financial_data)
+    totals = spending_totals_json(g.username)
+    # The static part's tag plus the totals identify the body without hashing all of it
+    return conditional_json(_FIN_PREFIX + totals + _FIN_SUFFIX, body_etag(_FIN_ETAG + totals))
+
+# Simple mock responses
+CHAT_RESPONSES = (
+    "I've analyzed your financial data. Based on your spending patterns, I recommend increasing your emergency fund to 3 months of expenses.",
+    "Looking at your budget, I suggest reducing entertainment expenses by 15% to meet your savings goals faster.",
+    "Your financial health is improving! Consider setting up automatic transfers to your savings account."
+)
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token != "mock_token_12345":
-        return jsonify({"error": "Invalid token"}), 401
-    
-    data = request.get_json()
+    data = request_json()
     user_message = data.get('message', '')
     
-    # Simple mock responses
-    responses = [
-        "I've analyzed your financial data. Based on your spending patterns, I recommend increasing your emergency fund to 3 months of expenses.",
-        "Looking at your budget, I suggest reducing entertainment expenses by 15% to meet your savings goals faster.",
-        "Your financial health is improving! Consider setting up automatic transfers to your savings account."
-    ]
-    
-    return jsonify({"response": random.choice(responses)})
+    return ojsonify({"response": _RNG.choice(CHAT_RESPONSES)})
 
 @app.route('/upload/statement', methods=['POST'])
 def upload_statement():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token != "mock_token_12345":
-        return jsonify({"error": "Invalid token"}), 401
+    statement = request.files.get('file')
+    if statement is None:
+        return ojsonify({"error": "No statement uploaded"}, status=400)
     
-    # Simulate processing time
-    import time
-    time.sleep(2)
+    # Hand processing to the worker and answer right away; clients poll /upload/status/<job_id>
+    job = statement_queue.enqueue(
+        process_statement, g.username, statement.filename, statement.read(),
+        meta={'username': g.username}
+    )
+    return ojsonify({"job_id": job.id, "status": job.get_status()}, status=202)
+
+@app.route('/upload/status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    try:
+        job = Job.fetch(job_id, connection=statement_queue.connection)
+    except NoSuchJobError:
+        job = None
+    if job is None or job.meta.get('username') != g.username:
+        return ojsonify({"error": "Unknown job"}, status=404)
     
-    return jsonify({"message": "Statement processed successfully"})
+    status = job.get_status()
+    if status == 'finished':
+        return ojsonify({"job_id": job.id, "status": status, "message": "Statement processed successfully"})
+    return ojsonify({"job_id": job.id, "status": status})
+
+# Mock sentiment analysis
+SENTIMENTS = ('positive', 'neutral', 'negative')
+SENTIMENT_SCORES = (0.8, 0.6, 0.4)
+SENTIMENT_KEYWORDS = ('savings', 'investment', 'budget')
 
 @app.route('/ai/analyze/sentiment', methods=['POST'])
 def analyze_sentiment():
-    data = request.get_json()
+    data = request_json()
     text = data.get('text', '')
     
-    # Mock sentiment analysis
-    sentiments = ['positive', 'neutral', 'negative']
-    scores = [0.8, 0.6, 0.4]
-    
-    return jsonify({
-        "sentiment": random.choice(sentiments),
-        "score": random.choice(scores),
-        "keywords": ["savings", "investment", "budget"][:random.randint(1, 3)]
+    return ojsonify({
+        "sentiment": _RNG.choice(SENTIMENTS),
+        "score": _RNG.choice(SENTIMENT_SCORES),
+        "keywords": _RNG.sample(SENTIMENT_KEYWORDS, _RNG.randint(1, 3))
     })
 
+# Mock document analysis, encoded once at import
+_ANALYZE_DOC_BYTES = orjson.dumps({
+    "insights": [
+        "You're spending 25% of income on dining out - consider reducing this",
+        "Your savings rate has improved by 5% compared to last month",
+        "Detected recurring subscriptions that could be optimized"
+    ],
+    "recommendations": [
+        "Set up automatic transfers to savings account",
+        "Review subscription services for potential savings",
+        "Consider refinancing your mortgage given current rates"
+    ]
+})
+
 @app.route('/ai/analyze/document', methods=['POST'])
 def analyze_document():
-    # Mock document analysis
-    return jsonify({
-        "insights": [
-            "You're spending 25% of income on dining out - consider reducing this",
-            "Your savings rate has improved by 5% compared to last month",
-            "Detected recurring subscriptions that could be optimized"
-        ],
-        "recommendations": [
-            "Set up automatic transfers to savings account",
-            "Review subscription services for potential savings",
-            "Consider refinancing your mortgage given current rates"
-        ]
-    })
+    # A fresh Response per request: after_request hooks (CORS) set headers on it
+    return Response(
+        _ANALYZE_DOC_BYTES,
+        mimetype='application/json',
+        headers={'Cache-Control': 'public, max-age=3600'}
+    )
+
+# Keyword intents for the mock AI chat, matched case-insensitively in a single pass
+# (ASCII-only case folding, so every match lowercases back to a key)
+AI_CHAT_INTENTS = {
+    "budget": "Based on your spending patterns, I recommend allocating more funds to your emergency fund.",
+    "investment": "Considering your risk profile, a 60/40 stock/bond allocation might be appropriate."
+}
+AI_CHAT_INTENT_RE = re.compile("|".join(map(re.escape, AI_CHAT_INTENTS)), re.IGNORECASE | re.ASCII)
+AI_CHAT_DEFAULT_RESPONSES = (
+    "I've analyzed your financial situation and suggest increasing your retirement contributions.",
+    "Your spending habits show good discipline. Consider investing your surplus cash.",
+    "I recommend building a 6-month emergency fund before pursuing aggressive investments."
+)
 
 @app.route('/ai/chat', methods=['POST'])
 def ai_chat():
-    data = request.get_json()
+    data = request_json()
     message = data.get('message', '')
     
-    # Mock AI responses based on message content
-    if 'budget' in message.lower():
-        response = "Based on your spending patterns, I recommend allocating more funds to your emergency fund."
-    elif 'investment' in message.lower():
-        response = "Considering your risk profile, a 60/40 stock/bond allocation might be appropriate."
+    # Mock AI responses based on the first intent keyword in the message
+    match = AI_CHAT_INTENT_RE.search(message)
+    if match:
+        response = AI_CHAT_INTENTS[match.group(0).lower()]
     else:
-        responses = [
-            "I've analyzed your financial situation and suggest increasing your retirement contributions.",
-            "Your spending habits show good discipline. Consider investing your surplus cash.",
-            "I recommend building a 6-month emergency fund before pursuing aggressive investments."
-        ]
-        response = random.choice(responses)
+        response = _RNG.choice(AI_CHAT_DEFAULT_RESPONSES)
     
-    return jsonify({"response": response})
+    return ojsonify({"response": response})
 
+# Development server only; production runs under gunicorn via wsgi.py
 if __name__ == '__main__':
-    app.run(debug=True, port=8000)
\ No newline at end of file
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', port=8000)
\ No newline at end of file
@@ -0,0 +1,22 @@
+from numba import njit
+
+# Numeric kernels live in their own module so Streamlit reruns of app.py
+# reuse the already-compiled functions instead of re-decorating them.
+@njit(cache=True)
+def _health_score(income, savings, num_categories):
+    if income == 0:
+        return 0.0
+
+    savings_rate = (savings / income) * 100 if income > 0 else 0.0
+    expense_diversity = min(num_categories / 10, 1.0)  # Normalize to 0-1
+
+    # Weighted score (0-100)
+    score = (savings_rate * 0.6) + (expense_diversity * 40)
+    return min(max(score, 0.0), 100.0)
+
+def calculate_financial_health_score(income, num_categories, savings):
+    """Calculate simple financial health score"""
+    return _health_score(float(income), float(savings), float(num_categories))
+
+# Compile at import so the first request doesn't pay the JIT cost
+_health_score(1.0, 0.0, 1.0)
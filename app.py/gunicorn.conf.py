@@ -0,0 +1,9 @@
+import multiprocessing
+
+# Only reachable through the reverse proxy in nginx.conf
+bind = "127.0.0.1:8000"
+
+# gevent workers multiplex many in-flight IO-bound requests per process
+worker_class = "gevent"
+workers = multiprocessing.cpu_count() * 2 + 1
+worker_connections = 1000
@@ -0,0 +1,8 @@
+import time
+
+# Background jobs run by the RQ worker, started next to gunicorn with:
+#   rq worker statements --url $REDIS_URL
+def process_statement(username, filename, content):
+    # Simulate processing time
+    time.sleep(2)
+    return {"username": username, "filename": filename, "size": len(content)}
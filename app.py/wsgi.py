@@ -0,0 +1,13 @@
+# Production entrypoint: gunicorn -c gunicorn.conf.py wsgi:application
+# Patch blocking stdlib IO (sockets, DNS, ...) before Flask and the handlers are imported
+from gevent import monkey
+monkey.patch_all()
+
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from backend import app
+
+# Trust the client address and scheme forwarded by the reverse proxy (nginx.conf)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1)
+
+application = app